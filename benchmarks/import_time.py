@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Cold-start import time benchmark
+
+Times fresh interpreters running each statement, and reports the median
+cost over a bare interpreter in milliseconds. Run from the repository root:
+
+    $ python benchmarks/import_time.py [runs]
+"""
+
+import os
+import sys
+import subprocess
+import timeit
+
+STATEMENTS = [
+    'import techies',
+    'from techies import QueueHandler',
+    'from techies import Queue',
+    'import techies.landmines',
+]
+
+
+def cold_start(statement, runs):
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    cmd = [sys.executable, '-c', statement]
+    timer = timeit.Timer(lambda: subprocess.check_call(cmd, cwd=root))
+    times = sorted(timer.repeat(repeat=runs, number=1))
+
+    return times[len(times) // 2] * 1000
+
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    base = cold_start('pass', runs)
+
+    print('{0:<40}{1:>10.1f} ms'.format('(bare interpreter)', base))
+
+    for statement in STATEMENTS:
+        print('{0:<40}{1:>+10.1f} ms'.format(
+            statement, cold_start(statement, runs) - base
+        ))
@@ -54,6 +54,9 @@ setup(
     package_dir={'techies': 'techies'},
     include_package_data=True,
     install_requires=requires,
+    entry_points={
+        'console_scripts': ['techies = techies.cli:main']
+    },
     license=license,
     zip_safe=False,
     classifiers=(
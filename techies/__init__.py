@@ -15,19 +15,58 @@ __author__ = 'Runzhou Li (Leo)'
 __license__ = 'The MIT License (MIT)'
 __copyright__ = 'Runzhou Li (Leo)'
 
-from techies.landmines import (
-    Queue, UniQueue, CountQueue, MultiCounter, TsCounter, StateCounter
-)
+import sys
 
-from techies.stasistrap import (
-    QueueHandler, REF_LOG_FORMAT
-)
+# Public names resolve lazily where the interpreter allows it (PEP 562), so
+# that importing techies does not pay for redis until a landmine is used
+_lazy = {
+    'Queue': 'techies.landmines',
+    'UniQueue': 'techies.landmines',
+    'CountQueue': 'techies.landmines',
+    'PriorityQueue': 'techies.landmines',
+    'DelayedQueue': 'techies.landmines',
+    'StreamQueue': 'techies.landmines',
+    'MultiCounter': 'techies.landmines',
+    'TsCounter': 'techies.landmines',
+    'RateLimiter': 'techies.landmines',
+    'StateCounter': 'techies.landmines',
+    'batch': 'techies.landmines',
+    'QueueHandler': 'techies.stasistrap',
+    'REF_LOG_FORMAT': 'techies.stasistrap',
+}
 
 __all__ = [
-    'Queue', 'UniQueue', 'CountQueue', 'MultiCounter', 'TsCounter',
-    'StateCounter', 'QueueHandler', 'REF_LOG_FORMAT'
+    'Queue', 'UniQueue', 'CountQueue', 'PriorityQueue', 'DelayedQueue',
+    'StreamQueue', 'MultiCounter', 'TsCounter', 'RateLimiter',
+    'StateCounter', 'batch', 'QueueHandler', 'REF_LOG_FORMAT'
 ]
 
+if sys.version_info[:2] >= (3, 7):
+    def __getattr__(name):
+        if name not in _lazy:
+            raise AttributeError(
+                'module {0!r} has no attribute {1!r}'.format(__name__, name)
+            )
+
+        module = __import__(_lazy[name], fromlist=[name])
+        value = getattr(module, name)
+        globals()[name] = value
+
+        return value
+
+    def __dir__():
+        return sorted(set(globals()) | set(__all__))
+else:  # pragma: no cover
+    from techies.landmines import (
+        Queue, UniQueue, CountQueue, PriorityQueue, DelayedQueue,
+        StreamQueue, MultiCounter, TsCounter, RateLimiter, StateCounter,
+        batch
+    )
+
+    from techies.stasistrap import (
+        QueueHandler, REF_LOG_FORMAT
+    )
+
 # Set default logging handler to avoid "No handler found" warnings.
 import logging
 
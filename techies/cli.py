@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Techies' command line
+
+:copyright: (c) 2014 Runzhou Li (Leo)
+:license: The MIT License (MIT), see LICENSE for details.
+"""
+
+import sys
+import json
+import argparse
+
+from techies import landmines
+
+
+def inspect(args):
+    for spec in args.landmines:
+        name, _, key = spec.partition(':')
+        cls = getattr(landmines, name, None)
+
+        if not (isinstance(cls, type) and
+                issubclass(cls, landmines.RedisBase) and key):
+            raise ValueError('not a LANDMINE:KEY: {0}'.format(spec))
+
+        obj = cls(
+            key, host=args.host, port=args.port, db=args.db,
+            hash_tag=args.hash_tag
+        )
+        print(json.dumps(obj.inspect(batch=args.batch), sort_keys=True))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='techies')
+    commands = parser.add_subparsers(dest='command')
+
+    p = commands.add_parser(
+        'inspect',
+        help='report keys, elements, memory, encodings and TTLs, as one '
+             'JSON line per landmine'
+    )
+    p.add_argument(
+        'landmines', nargs='+', metavar='LANDMINE:KEY',
+        help='landmine class and key, e.g. TsCounter:demo_event'
+    )
+    p.add_argument('--host', default='localhost')
+    p.add_argument('--port', type=int, default=6379)
+    p.add_argument('--db', type=int, default=0)
+    p.add_argument('--hash-tag', action='store_true')
+    p.add_argument('--batch', type=int, default=100)
+    p.set_defaults(func=inspect)
+
+    args = parser.parse_args(argv)
+
+    if not getattr(args, 'func', None):
+        parser.error('a command is required')
+
+    try:
+        args.func(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,13 +5,17 @@
 # Taken from redis-py project
 
 import sys
-import collections
+
+try:  # Python 3.3+
+    from collections.abc import Mapping, Iterable
+except ImportError:
+    from collections import Mapping, Iterable
 
 if sys.version_info[0] < 3:
     from urlparse import urlparse
     from itertools import imap, izip
     from string import letters as ascii_letters
-    from Queue import Queue
+    from Queue import Queue, Empty, Full
     try:
         from cStringIO import StringIO as BytesIO
     except ImportError:
@@ -33,11 +37,6 @@ if sys.version_info[0] < 3:
     bytes = str
     long = long
 else:
-    from urllib.parse import urlparse
-    from io import BytesIO
-    from string import ascii_letters
-    from queue import Queue
-
     iteritems = lambda x: iter(x.items())
     iterkeys = lambda x: iter(x.keys())
     itervalues = lambda x: iter(x.values())
@@ -56,14 +55,38 @@ else:
     bytes = bytes
     long = int
 
-try:  # Python 3
-    from queue import LifoQueue, Empty, Full
-except ImportError:
-    from Queue import Empty, Full
+if sys.version_info[:2] >= (3, 7):
+    # Rarely needed names, imported on first access rather than with techies
+    _lazy = {
+        'urlparse': ('urllib.parse', 'urlparse'),
+        'BytesIO': ('io', 'BytesIO'),
+        'ascii_letters': ('string', 'ascii_letters'),
+        'Queue': ('queue', 'Queue'),
+        'LifoQueue': ('queue', 'LifoQueue'),
+        'Empty': ('queue', 'Empty'),
+        'Full': ('queue', 'Full'),
+    }
+
+    def __getattr__(name):
+        if name not in _lazy:
+            raise AttributeError(
+                'module {0!r} has no attribute {1!r}'.format(__name__, name)
+            )
+
+        module, attr = _lazy[name]
+        value = getattr(__import__(module, fromlist=[attr]), attr)
+        globals()[name] = value
+
+        return value
+elif sys.version_info[0] >= 3:
+    from urllib.parse import urlparse
+    from io import BytesIO
+    from string import ascii_letters
+    from queue import Queue, LifoQueue, Empty, Full
+else:
     try:  # Python 2.6 - 2.7
         from Queue import LifoQueue
     except ImportError:  # Python 2.5
-        from Queue import Queue
         # From the Python 2.7 lib. Python 2.5 already extracted the core
         # methods to aid implementating different queue organisations.
 
@@ -90,9 +113,9 @@ def unicode_data(d):
         return unicode(d)
     elif isinstance(d, bytes):
         return unicode(nativestr(d))
-    elif isinstance(d, collections.Mapping):
+    elif isinstance(d, Mapping):
         return dict(map(unicode_data, d.items()))
-    elif isinstance(d, collections.Iterable):
+    elif isinstance(d, Iterable):
         return type(d)(map(unicode_data, d))
     else:
         return d
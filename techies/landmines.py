@@ -10,27 +10,442 @@ Techies' landmines
 
 from __future__ import unicode_literals
 from techies.compat import (
-    unicode, nativestr, unicode_data
+    unicode, nativestr, unicode_data, iteritems, Mapping
 )
 
+import os
+import sys
+import base64
+import bisect
+import hashlib
 import time
-import redis
+import socket
+import signal
+import logging
+import threading
+import collections
 
-try:
-    import simplejson as json
-except:
-    import json
+# redis, multiprocessing and json are imported on first use, keeping
+# `import techies` cheap for processes that never touch a landmine
+json = None
+
+logger = logging.getLogger(__name__)
+
+# state inherited through fork() that must never be closed, see _checkpid()
+_orphans = []
+
+
+def _json():
+    global json
+
+    if json is None:
+        try:
+            import simplejson as json
+        except ImportError:
+            import json
+
+    return json
+
+
+class HashRing(object):
+
+    '''
+    Consistent hash ring, mapping names to node indexes
+
+    Each node is placed on the ring replicas times, by the MD5 of its label,
+    so that adding or removing a node only moves about 1/N of the names.
+    '''
+
+    def __init__(self, labels, replicas=160):
+        points = sorted(
+            (self._hash('{0}#{1}'.format(label, i)), node)
+            for node, label in enumerate(labels)
+            for i in range(replicas)
+        )
+        self._points = [p[0] for p in points]
+        self._nodes = [p[1] for p in points]
+
+    @staticmethod
+    def _hash(name):
+        digest = hashlib.md5(unicode(name).encode('utf-8')).hexdigest()
+
+        return int(digest[:8], 16)
+
+    def __getitem__(self, name):
+        i = bisect.bisect(self._points, self._hash(name))
+
+        return self._nodes[i % len(self._nodes)]
+
+
+_LENGTH_COMMANDS = {
+    'string': 'STRLEN',
+    'list': 'LLEN',
+    'set': 'SCARD',
+    'zset': 'ZCARD',
+    'hash': 'HLEN',
+    'stream': 'XLEN',
+}
+
+_TTL_BUCKETS = [('<1m', 60), ('<1h', 3600), ('<1d', 86400), ('>=1d', None)]
+
+
+def _ttl_bucket(ttl):
+    # TTL bucket of a PTTL reply
+    if ttl is None or ttl < 0:
+        return 'none'
+
+    for bucket, limit in _TTL_BUCKETS:
+        if limit is None or ttl < limit * 1000:
+            return bucket
+
+
+# the batch() in effect in each thread, see RedisBase._run()
+_batch_local = threading.local()
+
+
+def _discard(replies):
+    return None
+
+
+def _conn_key(conn):
+    # clients sharing a pipeline in a batch: those of the same server and db
+    pool = getattr(conn, 'connection_pool', None)
+
+    if pool is None:
+        return id(conn)
+
+    return type(pool), repr(sorted(iteritems(pool.connection_kwargs)))
+
+
+class Future(object):
+
+    '''
+    Result of a landmine call queued in a batch(), set once the batch has
+    been executed
+    '''
+
+    def __init__(self):
+        self._done = False
+        self._result = None
+        self._exception = None
+
+    def done(self):
+        return self._done
+
+    def result(self):
+        if self.exception() is not None:
+            raise self._exception
+
+        return self._result
+
+    def exception(self):
+        if not self._done:
+            raise RuntimeError('batch has not been executed yet')
+
+        return self._exception
+
+    def _set(self, result=None, exception=None):
+        self._result = result
+        self._exception = exception
+        self._done = True
+
+
+class Batch(object):
+
+    '''
+    Queues landmine calls of the current thread into pipelines, one per
+    Redis server and db, executed on exit, see batch()
+    '''
+
+    def __init__(self, transaction=False):
+        self.transaction = transaction
+        self._pipes = collections.OrderedDict()
+        self._calls = []
+        self._outer = None
+
+    def __enter__(self):
+        # a nested batch joins the one in effect
+        self._outer = getattr(_batch_local, 'batch', None)
+
+        if self._outer is not None:
+            return self._outer
+
+        _batch_local.batch = self
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if self._outer is not None:
+            return False
+
+        _batch_local.batch = None
+
+        if exc_type is None:
+            self.execute()
+        else:
+            self._abort(exc_value)
+
+        return False
+
+    def _queue(self, landmine, calls, parse):
+        future = Future()
+        slots = []
+
+        for conn, fn in calls:
+            key = _conn_key(conn)
+
+            if key not in self._pipes:
+                # cluster clients pipeline by slot but cannot wrap it in
+                # MULTI/EXEC
+                self._pipes[key] = [conn.pipeline(
+                    transaction=self.transaction and not landmine.cluster
+                ), 0]
+
+            entry = self._pipes[key]
+            fn(entry[0])
+            slots.append((key, entry[1]))
+            entry[1] += 1
+
+        self._calls.append((future, slots, parse))
+
+        return future
+
+    def _abort(self, exception):
+        for pipe, _ in self._pipes.values():
+            pipe.reset()
+
+        for future, _, _ in self._calls:
+            future._set(exception=exception)
+
+        self._pipes.clear()
+        self._calls = []
+
+    def execute(self):
+
+        '''
+        Executes all queued calls, one round trip per pipeline, and sets
+        their futures. Raises the first error of a whole pipeline, after
+        setting it on the futures of its calls.
+        '''
+
+        replies = {}
+        error = None
+
+        for key, (pipe, _) in iteritems(self._pipes):
+            try:
+                replies[key] = pipe.execute(raise_on_error=False)
+            except Exception as e:
+                replies[key] = e
+                error = error or e
+
+        for future, slots, parse in self._calls:
+            values = [
+                replies[key] if isinstance(replies[key], Exception)
+                else replies[key][i] for key, i in slots
+            ]
+            failed = [v for v in values if isinstance(v, Exception)]
+
+            if failed:
+                future._set(exception=failed[0])
+                continue
+
+            try:
+                future._set(parse(values))
+            except Exception as e:
+                future._set(exception=e)
+
+        self._pipes.clear()
+        self._calls = []
+
+        if error is not None:
+            raise error
+
+
+def batch(transaction=False):
+
+    '''
+    Context manager under which the batchable calls of any landmine, in
+    the current thread, are queued and return a Future instead of running.
+    On exit, calls of all landmines on the same Redis server and db are
+    sent in one pipeline, wrapped in MULTI/EXEC with transaction=True, and
+    the futures are set. Other calls run immediately as usual.
+    '''
+
+    return Batch(transaction)
 
 
 class RedisBase(object):
 
-    def __init__(self, key, host='localhost', port=6379, db=0, **kwargs):
-        pool = redis.ConnectionPool(host=host, port=port, db=db)
-        self.conn = redis.StrictRedis(connection_pool=pool)
+    '''
+    Base of all landmines, holding the connection(s) to Redis
+
+    When nodes is given, as a list of dicts of connection kwargs (host,
+    port, db, defaulting to the ones given), the landmine is sharded on the
+    client side: each key is routed to a node by consistent hashing, and
+    self.conn is the node owning self.key. MultiCounter, TsCounter and
+    CountQueue shard more finely, by field, chunk and item respectively.
+
+    With cluster=True, self.conn is instead a Redis Cluster client using
+    host/port, or nodes, as startup nodes, from redis-py 4.1+ or else from
+    redis-py-cluster. Keys derived from self.key, like TsCounter chunks,
+    are then hash-tagged as {<key>}:<suffix>, placing them on the same slot
+    as self.key so that multi-key scripts and commands keep working. Pass
+    hash_tag to opt in or out regardless of cluster.
+
+    Landmines are safe to create before fork() and to share between
+    threads. Connections are (re)established on first use in every
+    process, those inherited from the parent being left untouched; redis-py
+    clients are thread safe, and per-thread state lives in self._local.
+    '''
+
+    # Lua sources by name, registered on connect() as self._scripts[name]
+    lua = {}
+
+    def __init__(self, key, host='localhost', port=6379, db=0, nodes=None,
+                 cluster=False, hash_tag=None, **kwargs):
+        default = dict(host=host, port=port, db=db)
+        self._nodes = [dict(default, **node) for node in nodes or [{}]]
+        self.cluster = cluster
+        self.hash_tag = cluster if hash_tag is None else hash_tag
         self.key = key
+        self.connect()
 
         self.initialize(**kwargs)
 
+    def _cluster(self):
+        try:  # redis-py 4.1+
+            from redis.cluster import RedisCluster, ClusterNode
+
+            return RedisCluster(startup_nodes=[
+                ClusterNode(node['host'], node['port'])
+                for node in self._nodes
+            ])
+        except ImportError:  # redis-py-cluster
+            from rediscluster import StrictRedisCluster
+
+            return StrictRedisCluster(startup_nodes=[
+                {'host': node['host'], 'port': node['port']}
+                for node in self._nodes
+            ])
+
+    def connect(self):
+        import redis
+
+        self._pid = os.getpid()
+        self._local = threading.local()
+
+        if self.cluster:
+            self._conns = [self._cluster()]
+        else:
+            self._conns = [
+                redis.StrictRedis(
+                    connection_pool=redis.ConnectionPool(**node)
+                ) for node in self._nodes
+            ]
+
+        self._ring = HashRing(
+            '{host}:{port}/{db}'.format(**node) for node in self._nodes
+        )
+        self._conn = self._node(self.key)
+        self._scripts = dict(
+            (name, self._conn.register_script(src))
+            for name, src in iteritems(self.lua)
+        )
+
+    def _checkpid(self):
+        if self._pid != os.getpid():
+            # Forked: the inherited connections share sockets with the
+            # parent, and closing them, even by garbage collection, would
+            # shut those down for the parent too, so they are kept aside
+            _orphans.append(self.__dict__.copy())
+            self.connect()
+
+    @property
+    def conn(self):
+        self._checkpid()
+
+        return self._conn
+
+    @property
+    def conns(self):
+        self._checkpid()
+
+        return self._conns
+
+    @property
+    def sharded(self):
+        return len(self.conns) > 1
+
+    def _node(self, name):
+        if not self.sharded:
+            return self.conns[0]
+
+        return self.conns[self._ring[name]]
+
+    def _group(self, names):
+        # pairs of node and the names routed to it, skipping idle nodes
+        groups = [[] for _ in self.conns]
+
+        for name in names:
+            groups[self._ring[name] if self.sharded else 0].append(name)
+
+        return [(conn, g) for conn, g in zip(self.conns, groups) if g]
+
+    def _subkey(self, suffix):
+        fmt = '{{{0}}}:{1}' if self.hash_tag else '{0}:{1}'
+
+        return fmt.format(self.key, suffix)
+
+    def _pipeline(self, transaction=True):
+        # cluster clients pipeline by slot but cannot wrap it in MULTI/EXEC
+        return self.conn.pipeline(
+            transaction=transaction and not self.cluster
+        )
+
+    def _run(self, calls, parse):
+        # calls are pairs of node and a function issuing one command on the
+        # client it is given, and parse turns the list of their replies into
+        # the result. In a batch() they are queued and a Future is returned,
+        # otherwise they run now, pipelined per node when several
+        current = getattr(_batch_local, 'batch', None)
+
+        if current is not None:
+            return current._queue(self, calls, parse)
+
+        replies = [None] * len(calls)
+        nodes = collections.OrderedDict()
+
+        for i, (conn, _) in enumerate(calls):
+            nodes.setdefault(id(conn), (conn, []))[1].append(i)
+
+        for conn, indexes in nodes.values():
+            if len(indexes) == 1:
+                replies[indexes[0]] = calls[indexes[0]][1](conn)
+                continue
+
+            pipe = conn.pipeline(transaction=False)
+
+            for i in indexes:
+                calls[i][1](pipe)
+
+            for i, v in zip(indexes, pipe.execute()):
+                replies[i] = v
+
+        return parse(replies)
+
+    def __getstate__(self):
+        # connections are not shareable, the receiving side reconnects
+        state = self.__dict__.copy()
+
+        for attr in ('_conn', '_conns', '_ring', '_scripts', '_local'):
+            state.pop(attr, None)
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.connect()
+
     def initialize(self, **kwargs):
         pass
 
@@ -38,11 +453,417 @@ class RedisBase(object):
         self.conn.delete(self.key)
         self.initialize(**kwargs)
 
+    # How keys are snapshot by export(): None for DUMP/RESTORE, or 'hash' or
+    # 'zset' for structures sharded by field or member, whose keys are then
+    # scanned and written back field by field, routed like any other write
+    _logical = None
+
+    def _keys(self):
+        # pairs of node and key, for all keys of the landmine
+        return [(self.conn, self.key)]
+
+    def _route(self, key):
+        # node to restore a key to
+        return self.conn
+
+    def _relative(self, key):
+        prefix = self._subkey('')
+
+        return None if key == self.key else key[len(prefix):]
+
+    def export(self, stream, batch=100):
+
+        '''
+        Writes a snapshot of all keys to the text stream, as newline
+        delimited JSON records, and returns the number of records.
+
+        Keys are read in pipelines of batch DUMP and PTTL commands, or,
+        for MultiCounter and CountQueue, scanned batch fields at a time.
+        Key names are stored relative to self.key, so that a snapshot can
+        be imported under another key, layout or set of nodes.
+        '''
+
+        json = _json()
+        n = 0
+
+        for conn, keys in self._batches(batch):
+            for record in self._export(conn, keys, batch):
+                stream.write(json.dumps(record) + '\n')
+                n += 1
+
+        return n
+
+    def _batches(self, size):
+        keys = self._keys()
+
+        for i in range(0, len(keys), size):
+            for conn in self.conns:
+                group = [k for c, k in keys[i:i + size] if c is conn]
+
+                if group:
+                    yield conn, group
+
+    def _export(self, conn, keys, batch):
+        if self._logical:
+            for key in keys:
+                for record in self._scan(conn, key, batch):
+                    yield record
+
+            return
+
+        pipe = conn.pipeline(transaction=False)
+
+        for key in keys:
+            pipe.dump(key)
+            pipe.pttl(key)
+
+        ret = pipe.execute()
+
+        for key, dump, ttl in zip(keys, ret[::2], ret[1::2]):
+            if dump is not None:  # expired in the meantime
+                yield {
+                    'key': self._relative(nativestr(key)), 'ttl': ttl,
+                    'dump': base64.b64encode(dump).decode('ascii')
+                }
+
+    def _scan(self, conn, key, batch):
+        ttl = conn.pttl(key)
+        scan = conn.hscan if self._logical == 'hash' else conn.zscan
+        cursor = None
+
+        while cursor != 0:
+            cursor, items = scan(key, cursor or 0, count=batch)
+
+            if isinstance(items, dict):
+                items = list(iteritems(items))
+
+            if items:
+                yield {
+                    'key': self._relative(nativestr(key)), 'ttl': ttl,
+                    self._logical: [
+                        [unicode_data(k), unicode_data(v)] for k, v in items
+                    ]
+                }
+
+    def inspect(self, batch=100):
+
+        '''
+        Reports on the keys of the landmine as a dict: number of keys,
+        number of elements, server-reported memory usage in bytes (Redis
+        4.0+), counts of keys per type and per internal encoding, and a
+        distribution of TTLs. Keys are looked up in pipelines of batch.
+        '''
+
+        r = {
+            'landmine': type(self).__name__,
+            'key': self.key,
+            'keys': 0,
+            'elements': 0,
+            'memory': 0,
+            'types': {},
+            'encodings': {},
+            'ttl': dict((b, 0) for b, _ in _TTL_BUCKETS + [('none', 0)]),
+        }
+
+        for conn, keys in self._batches(batch):
+            pipe = conn.pipeline(transaction=False)
+
+            for key in keys:
+                pipe.type(key)
+                pipe.execute_command('MEMORY', 'USAGE', key)
+                pipe.object('encoding', key)
+                pipe.pttl(key)
+
+            ret = pipe.execute(raise_on_error=False)
+            found = []
+
+            for i, key in enumerate(keys):
+                kind, memory, encoding, ttl = [
+                    None if isinstance(v, Exception) else v
+                    for v in ret[i * 4:i * 4 + 4]
+                ]
+                kind = nativestr(kind or 'none')
+
+                if kind == 'none':
+                    continue
+
+                found.append((key, kind))
+                r['keys'] += 1
+                r['memory'] += memory or 0
+                r['types'][kind] = r['types'].get(kind, 0) + 1
+                encoding = unicode(nativestr(encoding or 'unknown'))
+                r['encodings'][encoding] = r['encodings'].get(encoding, 0) + 1
+                r['ttl'][_ttl_bucket(ttl)] += 1
+
+            for key, kind in found:
+                if kind in _LENGTH_COMMANDS:
+                    pipe.execute_command(_LENGTH_COMMANDS[kind], key)
+
+            r['elements'] += sum(int(v or 0) for v in pipe.execute())
+
+        return r
+
+    def import_(self, stream, batch=100):
+
+        '''
+        Restores a snapshot written by export() from the text stream, in
+        pipelines of batch records, and returns the number of records.
+        Keys and fields in the snapshot are replaced, TTLs are preserved.
+        '''
+
+        json = _json()
+        n = 0
+        records = []
+
+        for line in stream:
+            if line.strip():
+                records.append(json.loads(line))
+
+            if len(records) == batch:
+                n += self._import(records)
+                records = []
+
+        return n + self._import(records)
+
+    def _import(self, records):
+        pipes = dict((id(conn), conn.pipeline(transaction=False))
+                     for conn in self.conns)
+
+        for record in records:
+            rel = record['key']
+            key = self.key if rel is None else self._subkey(rel)
+            ttl = max(record['ttl'], 0)
+
+            if 'dump' in record:
+                pipes[id(self._route(key))].execute_command(
+                    'RESTORE', key, ttl, base64.b64decode(record['dump']),
+                    'REPLACE'
+                )
+                continue
+
+            items = dict(record.get('hash') or record.get('zset'))
+
+            for conn, names in self._group(list(items)):
+                pipe = pipes[id(conn)]
+
+                if 'hash' in record:
+                    pipe.hmset(key, dict((k, items[k]) for k in names))
+                else:
+                    args = []
+
+                    for k in names:
+                        args.extend([items[k], k])
+
+                    pipe.execute_command('ZADD', key, *args)
+
+                if ttl:
+                    pipe.pexpire(key, ttl)
+
+        for pipe in pipes.values():
+            pipe.execute()
+
+        return len(records)
+
+
+class _LRUCache(object):
+
+    # size bounded, TTL expiring cache of (key, field) -> value, thread safe
+    # since entries are invalidated from tracker threads
+
+    def __init__(self, size, ttl=None):
+        self.size = size
+        self.ttl = ttl
+        # bumped on every invalidation, so that a value read from Redis
+        # before a concurrent invalidation is not cached after it
+        self.generation = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, field):
+        with self._lock:
+            expires, value = self._data.pop((key, field))
+
+            if expires is not None and expires < time.time():
+                raise KeyError((key, field))
+
+            self._data[(key, field)] = expires, value  # most recently used
+
+            return value
+
+    def set(self, key, field, value, generation):
+        expires = time.time() + self.ttl if self.ttl else None
+
+        with self._lock:
+            if generation != self.generation:
+                return
+
+            self._data.pop((key, field), None)
+            self._data[(key, field)] = expires, value
+
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, keys=None):
+        with self._lock:
+            self.generation += 1
+
+            if keys is None:
+                self._data.clear()
+                return
+
+            for entry in [e for e in self._data if e[0] in keys]:
+                del self._data[entry]
+
+
+class _Tracker(object):
+
+    '''
+    Server-assisted client side caching invalidation (Redis 6.0+)
+
+    Opens two dedicated connections: one subscribed to __redis__:invalidate,
+    read by a daemon thread, and one with CLIENT TRACKING on in broadcast
+    mode for the given key prefixes, redirecting to the former. Changed
+    keys are passed to callback, or None when invalidations may have been
+    lost, after which the tracker is no longer alive.
+    '''
+
+    def __init__(self, client, prefixes, callback):
+        pool = client.connection_pool
+        self.callback = callback
+        self._listener = pool.connection_class(**pool.connection_kwargs)
+        self._listener.send_command('CLIENT', 'ID')
+        client_id = self._listener.read_response()
+        self._listener.send_command('SUBSCRIBE', '__redis__:invalidate')
+        self._listener.read_response()
+
+        args = ['CLIENT', 'TRACKING', 'ON', 'REDIRECT', client_id, 'BCAST']
+
+        for prefix in prefixes:
+            args.extend(['PREFIX', prefix])
+
+        self._tracking = pool.connection_class(**pool.connection_kwargs)
+        self._tracking.send_command(*args)
+        self._tracking.read_response()
+
+        self.alive = True
+        thread = threading.Thread(target=self._listen)
+        thread.daemon = True
+        thread.start()
+
+    def _listen(self):
+        try:
+            while True:
+                msg = self._listener.read_response()
+
+                if nativestr(msg[0]) == 'unsubscribe':  # from close()
+                    break
+
+                if nativestr(msg[0]) == 'message':
+                    keys = msg[2]
+                    self.callback(
+                        keys and set(nativestr(k) for k in keys)
+                    )
+        except Exception:
+            pass
+        finally:
+            self.alive = False
+            self.callback(None)
+            self._listener.disconnect()
+
+    def close(self):
+        self._tracking.disconnect()
+
+        if self.alive:
+            self._listener.send_command('UNSUBSCRIBE')
+
 
 class RedisHashBase(RedisBase):
 
+    '''
+    Base of Redis Hash based landmines
+
+    With cache set to a number of entries, hot single field reads are
+    served from a process local LRU cache, whose entries expire after
+    cache_ttl seconds at the latest. Writes by any client invalidate them
+    through server-assisted client tracking (Redis 6.0+), immediately
+    for writes through this object. Not available on a cluster.
+    '''
+
+    def __init__(self, key, cache=0, cache_ttl=60, **kwargs):
+        self._cache_args = (cache, cache_ttl)
+
+        if sys.version_info[:2] > (2, 6):
+            super(RedisHashBase, self).__init__(key, **kwargs)
+        else:
+            RedisBase.__init__(self, key, **kwargs)
+
+    def connect(self):
+        if sys.version_info[:2] > (2, 6):
+            super(RedisHashBase, self).connect()
+        else:
+            RedisBase.connect(self)
+
+        # a new cache per process, whose lock is never inherited held
+        size, ttl = self._cache_args
+        self._cache = _LRUCache(size, ttl) if size else None
+        self._trackers = []
+
+        if self._cache is None:
+            return
+
+        if self.cluster:
+            raise ValueError('cache is not supported on a cluster')
+
+        prefixes = [self.key]
+
+        if self.hash_tag:
+            prefixes.append('{{{0}}}'.format(self.key))
+
+        self._trackers = [
+            _Tracker(conn, prefixes, self._cache.invalidate)
+            for conn in self.conns
+        ]
+
+    def __getstate__(self):
+        if sys.version_info[:2] > (2, 6):
+            state = super(RedisHashBase, self).__getstate__()
+        else:
+            state = RedisBase.__getstate__(self)
+
+        state.pop('_trackers', None)
+        state.pop('_cache', None)
+
+        return state
+
+    def close(self):
+
+        ''' stops cache invalidation tracking, disabling the cache '''
+
+        for tracker in self._trackers:
+            tracker.close()
+
+    def _hget(self, key, field, conn=None):
+        conn = conn or self.conn
+        field = unicode(field)
+
+        if self._cache is None or not all(t.alive for t in self._trackers):
+            return conn.hget(key, field)
+
+        try:
+            return self._cache.get(key, field)
+        except KeyError:
+            generation = self._cache.generation
+            value = conn.hget(key, field)
+            self._cache.set(key, field, value, generation)
+
+            return value
+
+    def _invalidate(self, key):
+        if self._cache is not None:
+            self._cache.invalidate(set([key]))
+
     def __str__(self):
-        return json.dumps(
+        return _json().dumps(
             unicode_data(self.json()), ensure_ascii=False
         )
 
@@ -66,10 +887,86 @@ class MultiCounter(RedisHashBase):
     '''
 
     def get_count(self, field):
-        return int(self.conn.hget(self.key, field) or 0)
+        return int(self._hget(self.key, field, self._node(field)) or 0)
+
+    _logical = 'hash'
+
+    def _keys(self):
+        return [(conn, self.key) for conn in self.conns]
+
+    def get_counts(self, fields):
+
+        ''' counts of all fields as a dict, one HMGET per node '''
+
+        groups = self._group([unicode(f) for f in fields])
+
+        def parse(replies):
+            return dict(
+                (field, int(v or 0))
+                for (_, names), values in zip(groups, replies)
+                for field, v in zip(names, values)
+            )
+
+        return self._run([
+            (conn, lambda c, names=names: c.hmget(self.key, names))
+            for conn, names in groups
+        ], parse)
+
+    def incr(self, field, amount=1):
+        def parse(replies):
+            self._invalidate(self.key)
+
+            return int(replies[0])
+
+        return self._run([(
+            self._node(field),
+            lambda c: c.hincrby(self.key, field, amount)
+        )], parse)
+
+    def incr_many(self, fields):
+
+        '''
+        Increments many fields at once, given as a mapping of field to
+        amount, or an iterable of fields, each occurrence counting as 1.
+        Amounts are summed up per field first, then written in one pipeline
+        per node. Returns the new counts as a dict.
+        '''
+
+        amounts = collections.defaultdict(int)
+
+        if isinstance(fields, Mapping):
+            fields = iteritems(fields)
+        else:
+            fields = ((field, 1) for field in fields)
+
+        for field, amount in fields:
+            amounts[unicode(field)] += amount
+
+        names = list(amounts)
+
+        def parse(replies):
+            self._invalidate(self.key)
+
+            return dict(zip(names, map(int, replies)))
 
-    def incr(self, field):
-        self.conn.hincrby(self.key, field, 1)
+        return self._run([(
+            self._node(field),
+            lambda c, field=field: c.hincrby(self.key, field, amounts[field])
+        ) for field in names], parse)
+
+    def clear(self):
+        for conn in self.conns:
+            conn.delete(self.key)
+
+        self._invalidate(self.key)
+
+    def json(self):
+        r = {}
+
+        for conn in self.conns:
+            r.update(conn.hgetall(self.key))
+
+        return unicode_data(r)
 
 
 class TsCounter(RedisHashBase):
@@ -106,11 +1003,9 @@ class TsCounter(RedisHashBase):
             timestamp = time.time()
 
         timestamp = int(timestamp)
-        key = '{0}:{1}'.format(
-            self.key, timestamp - timestamp % self.chunk_size
-        )
+        key = self._subkey(timestamp - timestamp % self.chunk_size)
 
-        return int(self.conn.hget(key, timestamp) or 0)
+        return int(self._hget(key, timestamp, self._node(key)) or 0)
 
     def incr(self, timestamp=None):
         if not timestamp:
@@ -118,25 +1013,49 @@ class TsCounter(RedisHashBase):
 
         timestamp = int(timestamp)
         chunk = timestamp - timestamp % self.chunk_size
-        key = '{0}:{1}'.format(self.key, chunk)
+        key = self._subkey(chunk)
+
+        conn = self._node(key)
+
+        def parse(replies):
+            self._invalidate(key)
+
+        return self._run([
+            (conn, lambda c: c.hincrby(key, timestamp, 1)),
+            (conn, lambda c: c.expireat(key, chunk + self.ttl)),
+        ], parse)
+
+    def _keys(self):
+        return [(conn, c) for conn, chunks in self._node_chunks()
+                for c in chunks]
+
+    def _route(self, key):
+        return self._node(key)
 
-        self.conn.hincrby(key, timestamp, 1)
-        self.conn.expireat(key, chunk + self.ttl)
+    def _node_chunks(self):
+        # SCAN rather than KEYS, not to block the server on large keyspaces
+        for conn in self.conns:
+            yield conn, list(set(
+                conn.scan_iter(match=self._subkey('*'), count=1000)
+            ))
 
     def _chunks(self):
-        return self.conn.keys(self.key + ':*')
+        return [c for _, chunks in self._node_chunks() for c in chunks]
 
     def clear(self):
-        chunks = self._chunks()
+        for conn, chunks in self._node_chunks():
+            if len(chunks) > 0:
+                conn.delete(*chunks)
 
-        if len(chunks) > 0:
-            self.conn.delete(*chunks)
+        if self._cache is not None:
+            self._cache.invalidate()
 
     def json(self):
         r = {}
 
-        for chunk in self._chunks():
-            r[chunk] = self.conn.hgetall(chunk)
+        for conn, chunks in self._node_chunks():
+            for chunk in chunks:
+                r[chunk] = conn.hgetall(chunk)
 
         return unicode_data(r)
 
@@ -156,37 +1075,47 @@ class StateCounter(RedisHashBase):
         if not self.conn.exists(self.key):
             self.start()
             self.conn.hset(self.key, 'total', kwargs.get('total', 0))
+            self._invalidate(self.key)
 
     def clear(self):
         self.conn.delete(self.key)
+        self._invalidate(self.key)
 
     def get_state(self):
-        return int(self.conn.hget(self.key, 'state') or 0)
+        return int(self._hget(self.key, 'state') or 0)
 
     def get_count(self):
-        return int(self.conn.hget(self.key, 'count') or 0)
+        return int(self._hget(self.key, 'count') or 0)
 
     def get_total(self):
-        return int(self.conn.hget(self.key, 'total') or 0)
+        return int(self._hget(self.key, 'total') or 0)
 
     def start(self):
         if self.stopped:
             self._count2total()
             self.conn.hset(self.key, 'state', 1)
+            self._invalidate(self.key)
 
     def stop(self):
         self.conn.hset(self.key, 'state', 0)
         self._count2total()
 
     def _count2total(self):
-        self.conn.hincrby(self.key, 'total', self.get_count())
+        count = self.conn.hget(self.key, 'count')  # never from cache
+        self.conn.hincrby(self.key, 'total', int(count or 0))
         self.conn.hset(self.key, 'count', 0)
+        self._invalidate(self.key)
 
     def incr(self):
         if self.stopped:
             self.start()
 
-        self.conn.hincrby(self.key, 'count', 1)
+        def parse(replies):
+            self._invalidate(self.key)
+
+        return self._run(
+            [(self.conn, lambda c: c.hincrby(self.key, 'count', 1))], parse
+        )
 
     @property
     def started(self):
@@ -203,6 +1132,132 @@ class StateCounter(RedisHashBase):
         return self.json()
 
 
+class RateLimiter(TsCounter):
+
+    '''
+    A rate limiter, based on the chunked Redis Hashes of TsCounter
+
+    Admits at most limit units per window seconds, per ident, where each
+    ident has its own TsCounter namespace <key>:<ident> (or <key> itself
+    without ident). The chunk size is the window. allow() counts the window
+    and increments it if under the limit in a single server-side script.
+
+    With sliding=True (default), the window is the last window seconds,
+    summed from the per second fields of the current and previous chunk;
+    otherwise it is the current chunk, a fixed window aligned on epoch.
+    '''
+
+    lua = {
+        'allow': '''
+            local now = tonumber(ARGV[1])
+            local window = tonumber(ARGV[2])
+            local cost = tonumber(ARGV[4])
+            local count = 0
+            if ARGV[5] == '1' then
+                for _, key in ipairs(KEYS) do
+                    local kv = redis.call('HGETALL', key)
+                    for i = 1, #kv, 2 do
+                        local t = tonumber(kv[i])
+                        if t > now - window and t <= now then
+                            count = count + tonumber(kv[i + 1])
+                        end
+                    end
+                end
+            else
+                for _, v in ipairs(redis.call('HVALS', KEYS[1])) do
+                    count = count + tonumber(v)
+                end
+            end
+            if count + cost > tonumber(ARGV[3]) then
+                return 0
+            end
+            redis.call('HINCRBY', KEYS[1], now, cost)
+            redis.call('EXPIREAT', KEYS[1], ARGV[6])
+            return 1
+        '''
+    }
+
+    def initialize(self, **kwargs):
+        self.limit = kwargs.get('limit', 60)
+        self.window = kwargs.get('window', 60)
+        self.sliding = kwargs.get('sliding', True)
+
+        if sys.version_info[:2] > (2, 6):
+            super(RateLimiter, self).initialize(chunk_size=self.window)
+        else:
+            TsCounter.initialize(self, chunk_size=self.window)
+
+    def _route(self, key):
+        # all chunks of a namespace live on its node, see allow()
+        return self._node(key.rsplit(':', 1)[0])
+
+    def allow(self, ident=None, cost=1, timestamp=None):
+        if not timestamp:
+            timestamp = time.time()
+
+        timestamp = int(timestamp)
+        chunk = timestamp - timestamp % self.chunk_size
+
+        chunks = [chunk, chunk - self.chunk_size][:2 if self.sliding else 1]
+
+        if ident is None:
+            namespace, keys = self.key, [self._subkey(c) for c in chunks]
+        else:
+            namespace = self._subkey(ident)
+            keys = ['{0}:{1}'.format(namespace, c) for c in chunks]
+
+        args = [
+            timestamp, self.window, self.limit, cost, int(self.sliding),
+            chunk + self.ttl
+        ]
+
+        return self._run([(
+            self._node(namespace),
+            lambda c: self._scripts['allow'](keys=keys, args=args, client=c)
+        )], lambda replies: bool(replies[0]))
+
+
+def _expand(items):
+    # items as a list, where a mapping of item to count repeats each item
+    if isinstance(items, Mapping):
+        return [var for var, n in iteritems(items) for _ in range(n)]
+
+    return list(items)
+
+
+def _consume(q, handler, worker, prefetch, block, interval, stop, stats):
+    # runs in a child process, Ctrl-C is handled by the parent through stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    r = {'worker': worker, 'pid': os.getpid(), 'items': 0, 'errors': 0}
+    start = time.time()
+
+    try:
+        while not stop.is_set():
+            items = q.get_many(prefetch)
+
+            if not items:
+                if not block:
+                    break
+
+                stop.wait(interval)
+                continue
+
+            for item in items:
+                try:
+                    handler(item)
+                    r['items'] += 1
+                except Exception:
+                    r['errors'] += 1
+                    logger.exception('Handler failed on %r', item)
+                finally:
+                    q.task_done()
+    finally:
+        r['elapsed'] = time.time() - start
+        r['rate'] = r['items'] / r['elapsed'] if r['elapsed'] else 0.0
+        stats.put(r)
+
+
 class Queue(RedisBase):
 
     '''
@@ -230,7 +1285,21 @@ class Queue(RedisBase):
         return self.qsize()
 
     def put(self, var, block=True, timeout=None):
-        self.conn.rpush(self.key, var)
+        return self._run(
+            [(self.conn, lambda c: c.rpush(self.key, var))], _discard
+        )
+
+    def put_many(self, items):
+
+        '''
+        puts all items in one round trip, given as an iterable, or as a
+        mapping of item to count, to put each item count times
+        '''
+
+        items = _expand(items)
+        calls = [(self.conn, lambda c: c.rpush(self.key, *items))]
+
+        return self._run(calls if items else [], _discard)
 
     def put_nowait(self, var):
         self.put(var, block=False)
@@ -241,6 +1310,137 @@ class Queue(RedisBase):
     def get_nowait(self):
         return self.get(block=False)
 
+    def get_many(self, size):
+
+        ''' pops up to size items from the front in one round trip '''
+
+        pipe = self._pipeline()
+        pipe.lrange(self.key, 0, size - 1)
+        pipe.ltrim(self.key, size, -1)
+
+        return [unicode(nativestr(v)) for v in pipe.execute()[0]]
+
+    def _bpop(self, timeout):
+        ret = self.conn.blpop(self.key, timeout)
+
+        return ret and unicode(nativestr(ret[1]))
+
+    def drain(self, batch=100, block=False, timeout=None):
+
+        '''
+        Generator that pops items in batches and yields them one at a time
+
+        Stops when the queue is empty, unless block is True, in which case
+        it waits server-side for more items, stopping only after timeout
+        seconds without any (forever when timeout is None).
+        '''
+
+        while True:
+            items = self.get_many(batch)
+
+            if not items:
+                if not block:
+                    return
+
+                item = self._bpop(timeout or 0)
+
+                if not item:
+                    return
+
+                items = [item]
+
+            for item in items:
+                yield item
+
+    def __iter__(self):
+        return self.drain()
+
+    def consume(self, handler, workers=1, prefetch=1, block=False,
+                interval=1.0):
+
+        '''
+        Drains the queue with a pool of worker processes
+
+        Each worker opens its own connection, pops up to prefetch items per
+        round trip through get_many() and calls handler on every item. When
+        the queue is empty, workers exit unless block is True, in which case
+        they poll every interval seconds until interrupted (SIGINT/SIGTERM),
+        always finishing the batch at hand before exiting.
+
+        Returns a list of per-worker stats dicts with keys worker, pid,
+        items, errors, elapsed, rate (items per second) and exitcode. A
+        worker that died without reporting (killed, os._exit()) is not
+        waited for: its stats have its exitcode and no items.
+        '''
+
+        import multiprocessing
+        from techies.compat import Empty
+
+        stop = multiprocessing.Event()
+        stats = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(
+                target=_consume,
+                args=(self, handler, i, prefetch, block, interval, stop, stats)
+            ) for i in range(workers)
+        ]
+
+        try:
+            prev = signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        except ValueError:  # not in main thread
+            prev = None
+
+        try:
+            for p in procs:
+                p.start()
+
+            start = time.time()
+            r = {}
+
+            while len(r) < len(procs):
+                try:
+                    s = stats.get(timeout=interval)
+                    r[s['worker']] = s
+                except Empty:
+                    self._reap(procs, stats, r, start)
+                except KeyboardInterrupt:
+                    stop.set()
+
+            for p in procs:
+                p.join()
+                r[procs.index(p)]['exitcode'] = p.exitcode
+        finally:
+            if prev is not None:
+                signal.signal(signal.SIGTERM, prev)
+
+        return [r[i] for i in sorted(r)]
+
+    @staticmethod
+    def _reap(procs, stats, r, start):
+        # stats of workers that exited without reporting; an exited worker
+        # has flushed its report if it made one, so it is read first
+        from techies.compat import Empty
+
+        dead = [
+            i for i, p in enumerate(procs)
+            if i not in r and p.exitcode is not None
+        ]
+
+        while dead:
+            try:
+                s = stats.get(timeout=0.1)
+                r[s['worker']] = s
+            except Empty:
+                break
+
+        for i in dead:
+            if i not in r:
+                elapsed = time.time() - start
+                r[i] = {
+                    'worker': i, 'pid': procs[i].pid, 'items': 0,
+                    'errors': 0, 'elapsed': elapsed, 'rate': 0.0,
+                }
+
 
 class UniQueue(Queue):
 
@@ -255,8 +1455,24 @@ class UniQueue(Queue):
         return int(self.conn.zcard(self.key))
 
     def put(self, var, block=True, timeout=None):
-        if not self.conn.zscore(self.key, var):
-            self.conn.zadd(self.key, time.time(), var)
+        return self.put_many([var])
+
+    def put_many(self, items):
+        return self._zadd_nx(self.key, items)
+
+    def _zadd_nx(self, key, items):
+        args = []
+        t = time.time()
+
+        # keeps FIFO order within the batch despite the shared timestamp
+        for i, var in enumerate(items):
+            args.extend([t + i * 1e-6, var])
+
+        calls = [(self.conn, lambda c: c.execute_command(
+            'ZADD', key, 'NX', *args
+        ))]
+
+        return self._run(calls if args else [], _discard)
 
     def get(self, block=True, timeout=None):
         if self.empty():
@@ -269,6 +1485,18 @@ class UniQueue(Queue):
 
         return unicode(nativestr(ret))
 
+    def get_many(self, size):
+        pipe = self._pipeline()
+        pipe.zrange(self.key, 0, size - 1)
+        pipe.zremrangebyrank(self.key, 0, size - 1)
+
+        return [unicode(nativestr(v)) for v in pipe.execute()[0]]
+
+    def _bpop(self, timeout):
+        ret = self.conn.execute_command('BZPOPMIN', self.key, timeout)
+
+        return ret and unicode(nativestr(ret[1]))
+
 
 class CountQueue(UniQueue):
 
@@ -279,10 +1507,39 @@ class CountQueue(UniQueue):
     the item has the highest count gets placed in front to be get() first
     '''
 
+    _logical = 'zset'
+
+    def _keys(self):
+        return [(conn, self.key) for conn in self.conns]
+
+    def qsize(self):
+        return sum(int(conn.zcard(self.key)) for conn in self.conns)
+
     def put(self, var, block=True, timeout=None):
-        self.conn.zincrby(self.key, var, 1)
+        return self.put_many([var])
+
+    def put_many(self, items):
+        counts = collections.defaultdict(int)
+
+        if isinstance(items, Mapping):
+            items = iteritems(items)
+        else:
+            items = ((var, 1) for var in items)
+
+        for var, n in items:
+            counts[var] += n
+
+        return self._run([(
+            self._node(var),
+            lambda c, var=var: c.zincrby(self.key, var, counts[var])
+        ) for var in counts], _discard)
 
     def get(self, block=True, timeout=None):
+        if self.sharded:
+            ret = self.get_many(1)
+
+            return ret[0] if ret else ()
+
         if self.empty():
             return ()
 
@@ -294,3 +1551,396 @@ class CountQueue(UniQueue):
         self.conn.zrem(self.key, ret[0])
 
         return unicode(nativestr(ret[0])), ret[1]
+
+    def get_many(self, size):
+        if self.sharded:
+            return self._get_many_sharded(size)
+
+        pipe = self._pipeline()
+        pipe.zrevrange(
+            self.key, 0, size - 1, withscores=True, score_cast_func=int
+        )
+        pipe.zremrangebyrank(self.key, -size, -1)
+
+        return [(unicode(nativestr(v)), c) for v, c in pipe.execute()[0]]
+
+    def _get_many_sharded(self, size):
+        # merges the top items of every node, then pops the overall top
+        # ones, skipping those popped by another consumer in the meantime
+        top = []
+
+        for i, conn in enumerate(self.conns):
+            top.extend((c, i, v) for v, c in conn.zrevrange(
+                self.key, 0, size - 1, withscores=True, score_cast_func=int
+            ))
+
+        top = sorted(top, key=lambda x: -x[0])[:size]
+        pipes = [conn.pipeline(transaction=False) for conn in self.conns]
+
+        for _, i, v in top:
+            pipes[i].zrem(self.key, v)
+
+        removed = [iter(pipe.execute()) for pipe in pipes]
+
+        return [
+            (unicode(nativestr(v)), c) for c, i, v in top if next(removed[i])
+        ]
+
+    def _bpop(self, timeout):
+        if self.sharded:
+            raise NotImplementedError(
+                'blocking pop is not supported across shards'
+            )
+
+        ret = self.conn.execute_command('BZPOPMAX', self.key, timeout)
+
+        return ret and (unicode(nativestr(ret[1])), int(float(ret[2])))
+
+    def clear(self):
+        for conn in self.conns:
+            conn.delete(self.key)
+
+
+class PriorityQueue(UniQueue):
+
+    '''
+    Multi-level Priority Queue, based on Redis Sorted Sets
+
+    One sorted set per priority level, keyed as <key>:<priority>, where
+    priority 0 is served first and levels - 1 last. Within a level items
+    are unique (like UniQueue) and served FIFO, scored by time.time().
+
+    Blocking get() is a single server-side BZPOPMIN across all levels in
+    priority order, so idle consumers do not poll (requires Redis 5.0+).
+    '''
+
+    lua = {
+        'pop': '''
+            local r = {}
+            local n = tonumber(ARGV[1])
+            for _, key in ipairs(KEYS) do
+                if n <= 0 then break end
+                local items = redis.call('ZRANGE', key, 0, n - 1)
+                if #items > 0 then
+                    redis.call('ZREMRANGEBYRANK', key, 0, #items - 1)
+                    for _, item in ipairs(items) do r[#r + 1] = item end
+                    n = n - #items
+                end
+            end
+            return r
+        '''
+    }
+
+    def initialize(self, **kwargs):
+        self.levels = kwargs.get('levels', 3)
+        # unprioritized items go to the lowest priority level by default
+        self.default_priority = kwargs.get(
+            'default_priority', self.levels - 1
+        )
+
+    def _level(self, priority):
+        if priority is None:
+            priority = self.default_priority
+
+        if not 0 <= priority < self.levels:
+            raise ValueError(
+                'priority must be within [0, {0})'.format(self.levels)
+            )
+
+        return self._subkey(priority)
+
+    def _levels(self):
+        return [self._level(i) for i in range(self.levels)]
+
+    def _keys(self):
+        return [(self.conn, key) for key in self._levels()]
+
+    def qsize(self):
+        pipe = self._pipeline(transaction=False)
+
+        for key in self._levels():
+            pipe.zcard(key)
+
+        return sum(pipe.execute())
+
+    def put(self, var, block=True, timeout=None, priority=None):
+        return self.put_many([var], priority=priority)
+
+    def put_many(self, items, priority=None):
+        return self._zadd_nx(self._level(priority), items)
+
+    def get(self, block=True, timeout=None):
+        if block:
+            return self._bpop(timeout or 0) or unicode()
+
+        ret = self.get_many(1)
+
+        return ret[0] if ret else unicode()
+
+    def get_many(self, size):
+        ret = self._scripts['pop'](keys=self._levels(), args=[size])
+
+        return [unicode(nativestr(v)) for v in ret]
+
+    def _bpop(self, timeout):
+        ret = self.conn.execute_command(
+            'BZPOPMIN', *(self._levels() + [timeout])
+        )
+
+        return ret and unicode(nativestr(ret[1]))
+
+    def clear(self):
+        self.conn.delete(*self._levels())
+
+
+class DelayedQueue(Queue):
+
+    '''
+    Delayed Queue, based on a Redis Sorted Set and a Redis List
+
+    Inherits Queue, whose Redis List under <key> holds the ready items.
+    Items put with a delay wait in a sorted set under <key>:delayed, scored
+    by their due epoch timestamp, where they are unique like in UniQueue.
+
+    All due items are moved to the ready list by one server-side script
+    call, which get() and get_many() run in the same round trip as the
+    pop. A blocking get() then waits on the ready list with BLPOP no longer
+    than until the next item is due, so timers are never polled per item.
+    '''
+
+    lua = {
+        'promote': '''
+            local moved = 0
+            repeat
+                local items = redis.call(
+                    'ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1],
+                    'LIMIT', 0, 1000
+                )
+                if #items > 0 then
+                    redis.call('RPUSH', KEYS[2], unpack(items))
+                    redis.call('ZREM', KEYS[1], unpack(items))
+                end
+                moved = moved + #items
+            until #items < 1000
+            local due = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+            return {moved, due[2]}
+        '''
+    }
+
+    def initialize(self, **kwargs):
+        self.delayed_key = self._subkey('delayed')
+
+    def _keys(self):
+        return [(self.conn, self.key), (self.conn, self.delayed_key)]
+
+    def scheduled(self):
+        return int(self.conn.zcard(self.delayed_key))
+
+    def put(self, var, block=True, timeout=None, delay=0):
+        if delay > 0:
+            def call(c):
+                return c.zadd(self.delayed_key, time.time() + delay, var)
+        else:
+            def call(c):
+                return c.rpush(self.key, var)
+
+        return self._run([(self.conn, call)], _discard)
+
+    def _promote(self, client=None):
+        return self._scripts['promote'](
+            keys=[self.delayed_key, self.key], args=[time.time()],
+            client=client
+        )
+
+    def promote(self):
+
+        ''' moves all due items to the ready list, returns how many '''
+
+        return self._promote()[0]
+
+    def get(self, block=True, timeout=None):
+        if not block:
+            ret = self.get_many(1)
+
+            return ret[0] if ret else unicode()
+
+        deadline = timeout and time.time() + timeout
+
+        while True:
+            ret = self._promote()
+            waits = []
+
+            if deadline:
+                waits.append(deadline - time.time())
+
+            if len(ret) > 1:  # wake up no later than the next due item
+                waits.append(float(ret[1]) - time.time())
+
+            ret = self.conn.blpop(
+                self.key, max(min(waits), 0.01) if waits else 0
+            )
+
+            if ret:
+                return unicode(nativestr(ret[1]))
+
+            if deadline and time.time() >= deadline:
+                return unicode()
+
+    def get_many(self, size):
+        pipe = self._pipeline()
+        self._promote(client=pipe)
+        pipe.lrange(self.key, 0, size - 1)
+        pipe.ltrim(self.key, size, -1)
+
+        return [unicode(nativestr(v)) for v in pipe.execute()[1]]
+
+    def _bpop(self, timeout):
+        return self.get(timeout=timeout or None) or None
+
+    def clear(self):
+        self.conn.delete(self.key, self.delayed_key)
+
+
+class StreamQueue(Queue):
+
+    '''
+    Stream Queue, based on Redis Stream with a consumer group
+
+    Inherits Queue, mapping put() to XADD, get() to XREADGROUP and
+    task_done() to XACK. Every item is delivered once per group, and stays
+    pending until acknowledged by task_done(), one call per item got, in
+    the order they were got. Pending items of dead consumers can be taken
+    over with reclaim(). Requires Redis 5.0+.
+
+    The consumer name defaults to <hostname>:<pid>, so that worker
+    processes sharing one object consume independently. When maxlen is
+    given, the stream is trimmed approximately (MAXLEN ~) on every put().
+    Unlike other queues, qsize() is the number of entries retained in the
+    stream (XLEN), delivered or not.
+    '''
+
+    def initialize(self, **kwargs):
+        self.group = kwargs.get('group', 'techies')
+        self.maxlen = kwargs.get('maxlen')
+        self._consumer = kwargs.get('consumer')
+        self._create_group()
+
+    @property
+    def _pending(self):
+        # ids got and not yet acknowledged by the current thread
+        try:
+            return self._local.pending
+        except AttributeError:
+            self._local.pending = collections.deque()
+
+            return self._local.pending
+
+    @property
+    def consumer(self):
+        return self._consumer or '{0}:{1}'.format(
+            socket.gethostname(), os.getpid()
+        )
+
+    def _create_group(self):
+        import redis
+
+        try:
+            self.conn.execute_command(
+                'XGROUP', 'CREATE', self.key, self.group, '0', 'MKSTREAM'
+            )
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in unicode(e):
+                raise
+
+    def _entries(self, entries):
+        # entries trimmed or deleted after delivery come back without fields
+        ret = []
+
+        for entry_id, fields in entries:
+            if fields:
+                self._pending.append(entry_id)
+                ret.append(unicode(nativestr(fields[1])))
+            else:
+                self.conn.execute_command(
+                    'XACK', self.key, self.group, entry_id
+                )
+
+        return ret
+
+    def _read(self, count, block=None):
+        args = ['GROUP', self.group, self.consumer, 'COUNT', count]
+
+        if block is not None:
+            args.extend(['BLOCK', int(block * 1000)])
+
+        ret = self.conn.execute_command(
+            'XREADGROUP', *(args + ['STREAMS', self.key, '>'])
+        )
+
+        return self._entries(ret[0][1]) if ret else []
+
+    def qsize(self):
+        return int(self.conn.execute_command('XLEN', self.key))
+
+    def _xadd(self, client, var):
+        args = ['MAXLEN', '~', self.maxlen] if self.maxlen else []
+        client.execute_command(
+            'XADD', self.key, *(args + ['*', 'data', var])
+        )
+
+    def put(self, var, block=True, timeout=None):
+        return self._run(
+            [(self.conn, lambda c: self._xadd(c, var))], _discard
+        )
+
+    def put_many(self, items):
+        return self._run([
+            (self.conn, lambda c, var=var: self._xadd(c, var))
+            for var in _expand(items)
+        ], _discard)
+
+    def get(self, block=True, timeout=None):
+        ret = self._read(1, block=(timeout or 0) if block else None)
+
+        return ret[0] if ret else unicode()
+
+    def get_many(self, size):
+        return self._read(size)
+
+    def _bpop(self, timeout):
+        ret = self._read(1, block=timeout)
+
+        return ret[0] if ret else None
+
+    def task_done(self):
+        if not self._pending:
+            raise ValueError('task_done() called too many times')
+
+        self.conn.execute_command(
+            'XACK', self.key, self.group, self._pending.popleft()
+        )
+
+    def reclaim(self, min_idle, count=100):
+
+        '''
+        Takes over up to count entries pending for more than min_idle
+        seconds on any consumer of the group, and returns them as got
+        '''
+
+        min_idle = int(min_idle * 1000)
+        pending = self.conn.execute_command(
+            'XPENDING', self.key, self.group, '-', '+', count
+        )
+        ids = [p[0] for p in pending if p[2] >= min_idle]
+
+        if not ids:
+            return []
+
+        return self._entries(self.conn.execute_command(
+            'XCLAIM', self.key, self.group, self.consumer, min_idle, *ids
+        ))
+
+    def clear(self):
+        self.conn.delete(self.key)
+        self._pending.clear()
+        self._create_group()
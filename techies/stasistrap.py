@@ -9,6 +9,10 @@ Techies' Stasis Trap
 """
 
 import sys
+import logging
+import traceback
+from collections import defaultdict
+from threading import Timer
 from logging import Handler, NOTSET
 
 _ref_atributes = [
@@ -34,20 +38,77 @@ class QueueHandler(Handler):
 
     Inherits standard logging.Handler that emits to any standard Queue
     compatible implementations. Including the ones in techies.landmines module
+
+    With coalesce set to a number of seconds, identical formatted messages
+    are counted in process instead, and flushed at most that long after the
+    first one, as a mapping of message to count, through q.put_many() when
+    available (one ZINCRBY by count per message for CountQueue) or else
+    q.put() once per occurrence. flush() and close() flush right away.
     '''
 
-    def __init__(self, q, level=NOTSET):
+    def __init__(self, q, level=NOTSET, coalesce=None):
         if sys.version_info[:2] > (2, 6):
             super(QueueHandler, self).__init__(level)
         else:
             Handler.__init__(self, level)
 
         self.q = q
+        self.coalesce = coalesce
+        self._counts = defaultdict(int)
+        self._timer = None
 
     def emit(self, record):
         try:
-            self.q.put(self.format(record))
+            msg = self.format(record)
+
+            if not self.coalesce:
+                self.q.put(msg)
+                return
+
+            # called with self.lock held, see Handler.handle()
+            self._counts[msg] += 1
+
+            if self._timer is None:
+                self._timer = Timer(self.coalesce, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
         except (KeyboardInterrupt, SystemExit):
             raise
         except:
             self.handleError(record)
+
+    def flush(self):
+        self.acquire()
+
+        try:
+            counts, self._counts = self._counts, defaultdict(int)
+
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        finally:
+            self.release()
+
+        if not counts:
+            return
+
+        try:
+            if hasattr(self.q, 'put_many'):
+                self.q.put_many(counts)
+            else:
+                for msg, n in counts.items():
+                    for _ in range(n):
+                        self.q.put(msg)
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except:
+            if logging.raiseExceptions:
+                traceback.print_exc(file=sys.stderr)
+
+    def close(self):
+        self.flush()
+
+        if sys.version_info[:2] > (2, 6):
+            super(QueueHandler, self).close()
+        else:
+            Handler.close(self)
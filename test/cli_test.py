@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+import random
+import string
+import json
+
+import sys
+import os
+
+target_path = os.path.join(os.path.dirname(__file__), '..', 'techies')
+sys.path.append(target_path)
+
+# Compat layer to support some tests
+from compat import (
+    xrange, BytesIO
+)
+
+if sys.version_info[0] < 3:
+    StringIO = BytesIO
+else:
+    from io import StringIO
+
+# Landmines to support testing
+from landmines import (
+    CountQueue
+)
+
+# Test Targets
+from cli import (
+    main
+)
+
+
+class InspectTest(unittest.TestCase):
+
+    def setUp(self):
+        self.key = ''.join(
+            random.SystemRandom().choice(string.ascii_uppercase)
+            for _ in xrange(12)
+        )
+        self.q = CountQueue(self.key)
+        self.stdout = sys.stdout
+        sys.stdout = StringIO()
+
+    def test_inspect(self):
+        self.q.put_many({'a': 2, 'b': 1})
+
+        main(['inspect', 'CountQueue:' + self.key, 'Queue:' + self.key])
+        lines = sys.stdout.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+
+        v = json.loads(lines[0])
+        self.assertEqual(v['landmine'], 'CountQueue')
+        self.assertEqual(v['keys'], 1)
+        self.assertEqual(v['elements'], 2)
+        self.assertEqual(v['types'], {'zset': 1})
+
+    def test_invalid(self):
+        sys.stderr, stderr = StringIO(), sys.stderr
+
+        try:
+            for spec in ['Nope:' + self.key, 'HashRing:a', 'Queue']:
+                self.assertRaises(
+                    SystemExit, main, ['inspect', spec]
+                )
+        finally:
+            sys.stderr = stderr
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+        self.q.clear()
+
+if __name__ == '__main__':
+    unittest.main()
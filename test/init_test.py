@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+import subprocess
+
+import sys
+import os
+
+root_path = os.path.join(os.path.dirname(__file__), '..')
+
+
+def run(code):
+    return subprocess.check_output(
+        [sys.executable, '-c', code], cwd=root_path
+    ).decode().strip()
+
+
+@unittest.skipIf(sys.version_info[:2] < (3, 7), 'requires PEP 562')
+class LazyImportTest(unittest.TestCase):
+
+    def test_import(self):
+        v = run('import sys, techies; print("redis" in sys.modules)')
+        self.assertEqual(v, 'False')
+
+        v = run(
+            'import sys, techies; techies.QueueHandler; '
+            'print("techies.landmines" in sys.modules)'
+        )
+        self.assertEqual(v, 'False')
+
+    def test_getattr(self):
+        v = run('import techies; print(techies.Queue.__module__)')
+        self.assertEqual(v, 'techies.landmines')
+
+        v = run('from techies import *; print(REF_LOG_FORMAT[:12])')
+        self.assertEqual(v, '%(levelname)')
+
+        self.assertRaises(
+            subprocess.CalledProcessError, run, 'import techies; techies.Nope'
+        )
+
+    def test_construct(self):
+        v = run(
+            'import sys, techies; techies.Queue("k"); '
+            'print("redis" in sys.modules)'
+        )
+        self.assertEqual(v, 'True')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,9 @@ import unittest
 import random
 import string
 import time
+import io
+import pickle
+import threading
 
 try:
     import simplejson as json
@@ -29,11 +32,17 @@ def random_key():
         random.SystemRandom().choice(string.ascii_uppercase) for _ in xrange(12)
     )
 
+def _exit(item):
+    # handler of a worker dying without reporting
+    if item == 'exit':
+        os._exit(1)
+
 # Test Targets
 from landmines import (
-    RedisBase, RedisHashBase,
-    MultiCounter, TsCounter,
-    Queue, UniQueue, CountQueue, StateCounter
+    HashRing, RedisBase, RedisHashBase,
+    MultiCounter, TsCounter, RateLimiter,
+    Queue, UniQueue, CountQueue, StateCounter, PriorityQueue,
+    DelayedQueue, StreamQueue, batch
 )
 
 
@@ -107,6 +116,26 @@ class MultiCounterTest(RedisHashBaseTest):
         v = self.obj.conn.hget(self.key, 'f1')
         self.assertEqual(int(v), 1)
 
+        self.assertEqual(self.obj.incr('f1', amount=5), 6)
+
+    def test_get_counts(self):
+        self.assertEqual(self.obj.get_counts([]), {})
+
+        self.obj.incr('f1')
+        self.obj.incr('f2', 3)
+        v = self.obj.get_counts(['f1', 'f2', 'f3'])
+        self.assertEqual(v, {'f1': 1, 'f2': 3, 'f3': 0})
+
+    def test_incr_many(self):
+        self.assertEqual(self.obj.incr_many([]), {})
+
+        v = self.obj.incr_many(['f1', 'f2', 'f1', 'f1'])
+        self.assertEqual(v, {'f1': 3, 'f2': 1})
+
+        v = self.obj.incr_many({'f1': 10, 'f3': 2})
+        self.assertEqual(v, {'f1': 13, 'f3': 2})
+        self.assertEqual(self.obj.get_count('f2'), 1)
+
 
 class TsCounterTest(RedisHashBaseTest):
 
@@ -196,6 +225,56 @@ class TsCounterTest(RedisHashBaseTest):
             self.obj.conn.delete(*keys)
 
 
+class RateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.key = random_key()
+        self.obj = RateLimiter(self.key, limit=3, window=60)
+        t = int(time.time())
+        self.t = t - t % 60 + 50
+
+    def test_initialize(self):
+        self.assertEqual(self.obj.chunk_size, 60)
+        self.assertEqual(self.obj.ttl, 120)
+        self.assertTrue(self.obj.sliding)
+
+    def test_allow(self):
+        for _ in xrange(3):
+            self.assertTrue(self.obj.allow(timestamp=self.t))
+
+        self.assertFalse(self.obj.allow(timestamp=self.t))
+        self.assertEqual(self.obj.get_count(self.t), 3)
+
+        # independent idents
+        self.assertTrue(self.obj.allow('a', cost=3, timestamp=self.t))
+        self.assertFalse(self.obj.allow('a', timestamp=self.t))
+        self.assertTrue(self.obj.allow('b', timestamp=self.t))
+
+    def test_sliding(self):
+        self.assertTrue(self.obj.allow('a', cost=3, timestamp=self.t))
+
+        # next chunk, still within the window
+        self.assertFalse(self.obj.allow('a', timestamp=self.t + 30))
+        self.assertTrue(self.obj.allow('a', timestamp=self.t + 60))
+
+    def test_fixed(self):
+        self.obj.initialize(limit=3, window=60, sliding=False)
+        self.assertTrue(self.obj.allow('a', cost=3, timestamp=self.t))
+        self.assertFalse(self.obj.allow('a', timestamp=self.t))
+
+        # next chunk, a new fixed window
+        self.assertTrue(self.obj.allow('a', timestamp=self.t + 30))
+
+    def test_clear(self):
+        self.obj.allow(timestamp=self.t)
+        self.obj.allow('a', timestamp=self.t)
+        self.obj.clear()
+        self.assertEqual(self.obj._chunks(), [])
+
+    def tearDown(self):
+        self.obj.clear()
+
+
 class StateCounterTest(RedisHashBaseTest):
 
     def setUp(self):
@@ -337,6 +416,61 @@ class QueueTest(RedisBaseTest):
         v = self.obj.get()
         self.assertEqual(int(v), a)
 
+    def test_get_many(self):
+        self.assertEqual(self.obj.get_many(5), [])
+
+        for i in xrange(8):
+            self.obj.put(i)
+
+        v = self.obj.get_many(5)
+        self.assertEqual(v, [unicode(i) for i in xrange(5)])
+        self.assertEqual(self.obj.qsize(), 3)
+
+        v = self.obj.get_many(5)
+        self.assertEqual(v, [unicode(i) for i in xrange(5, 8)])
+        self.assertTrue(self.obj.empty())
+
+    def test_drain(self):
+        self.assertEqual(list(self.obj.drain()), [])
+
+        for i in xrange(8):
+            self.obj.put(i)
+
+        v = list(self.obj.drain(batch=3))
+        self.assertEqual(v, [unicode(i) for i in xrange(8)])
+        self.assertTrue(self.obj.empty())
+
+        self.obj.put(1)
+        v = list(self.obj.drain(block=True, timeout=0.1))
+        self.assertEqual(v, [unicode(1)])
+
+    def test_iter(self):
+        for i in xrange(3):
+            self.obj.put(i)
+
+        self.assertEqual(list(self.obj), [unicode(i) for i in xrange(3)])
+        self.assertTrue(self.obj.empty())
+
+    def test_consume(self):
+        s = random.randint(10, 50)
+        for i in xrange(s):
+            self.obj.put(i)
+
+        stats = self.obj.consume(unicode, workers=2, prefetch=4)
+        self.assertEqual(len(stats), 2)
+        self.assertEqual(sum(r['items'] for r in stats), s)
+        self.assertEqual(sum(r['errors'] for r in stats), 0)
+        self.assertEqual([r['exitcode'] for r in stats], [0, 0])
+        self.assertTrue(self.obj.empty())
+
+    def test_consume_dead_worker(self):
+        self.obj.put('exit')
+
+        stats = self.obj.consume(_exit, workers=1, block=True, interval=0.1)
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats[0]['exitcode'], 1)
+        self.assertEqual(stats[0]['items'], 0)
+
 
 class UniQueueTest(QueueTest):
 
@@ -387,5 +521,736 @@ class CountQueueTest(UniQueueTest):
         v = self.obj.get()
         self.assertEqual(v, (unicode(a), n))
 
+    def test_get_many(self):
+        self.assertEqual(self.obj.get_many(5), [])
+
+        for i in xrange(4):
+            for _ in xrange(i + 1):
+                self.obj.put(i)
+
+        v = self.obj.get_many(3)
+        self.assertEqual(v, [(unicode(i), i + 1) for i in (3, 2, 1)])
+        self.assertEqual(self.obj.get_many(3), [(unicode(0), 1)])
+        self.assertTrue(self.obj.empty())
+
+    def test_drain(self):
+        self.assertEqual(list(self.obj.drain()), [])
+
+        for i in xrange(4):
+            for _ in xrange(i + 1):
+                self.obj.put(i)
+
+        v = list(self.obj.drain(batch=3))
+        self.assertEqual(v, [(unicode(i), i + 1) for i in (3, 2, 1, 0)])
+        self.assertTrue(self.obj.empty())
+
+    def test_iter(self):
+        self.obj.put('a')
+        self.obj.put('a')
+
+        self.assertEqual(list(self.obj), [(unicode('a'), 2)])
+
+
+class PriorityQueueTest(UniQueueTest):
+
+    def setUp(self):
+        self.key = random_key()
+        self.obj = PriorityQueue(self.key)
+
+    def test_initialize(self):
+        self.assertEqual(self.obj.levels, 3)
+        self.assertEqual(self.obj.default_priority, 2)
+
+        self.obj.initialize(levels=5, default_priority=0)
+        self.assertEqual(self.obj.levels, 5)
+        self.assertEqual(self.obj.default_priority, 0)
+
+    def test_clear(self):
+        self.obj.clear()
+        self.assertTrue(self.obj.empty())
+
+        for i in xrange(self.obj.levels):
+            self.obj.put(i, priority=i)
+
+        self.obj.clear()
+        self.assertTrue(self.obj.empty())
+
+    def test_get(self):
+        self.assertEqual(self.obj.get(block=False), unicode())
+        self.assertEqual(self.obj.get(timeout=0.1), unicode())
+
+        self.obj.put('low')
+        self.obj.put('high', priority=0)
+        self.obj.put('mid', priority=1)
+
+        self.assertEqual(self.obj.get(), 'high')
+        self.assertEqual(self.obj.get(block=False), 'mid')
+        self.assertEqual(self.obj.get(timeout=0.1), 'low')
+
+    def test_put(self):
+        self.assertRaises(ValueError, self.obj.put, 1, priority=3)
+        self.assertRaises(ValueError, self.obj.put, 1, priority=-1)
+
+        if sys.version_info[:2] > (2, 6):
+            super(PriorityQueueTest, self).test_put()
+        else:
+            UniQueueTest.test_put(self)
+
+    def test_put_many(self):
+        self.obj.put_many(xrange(5), priority=1)
+        self.obj.put_many(xrange(5, 10), priority=0)
+        self.obj.put_many([])
+
+        self.assertEqual(self.obj.qsize(), 10)
+        v = self.obj.get_many(7)
+        self.assertEqual(v, [unicode(i) for i in list(xrange(5, 10)) + [0, 1]])
+
+    def tearDown(self):
+        self.obj.clear()
+
+
+class DelayedQueueTest(QueueTest):
+
+    def setUp(self):
+        self.key = random_key()
+        self.obj = DelayedQueue(self.key)
+
+    def test_clear(self):
+        self.obj.put(1)
+        self.obj.put(2, delay=60)
+        self.obj.clear()
+        self.assertTrue(self.obj.empty())
+        self.assertEqual(self.obj.scheduled(), 0)
+
+    def test_get(self):
+        self.assertEqual(self.obj.get(block=False), unicode())
+        self.assertEqual(self.obj.get(timeout=0.1), unicode())
+
+        self.obj.put('now')
+        self.obj.put('soon', delay=0.2)
+        self.obj.put('later', delay=60)
+
+        self.assertEqual(self.obj.get(block=False), 'now')
+        self.assertEqual(self.obj.get(block=False), unicode())
+        self.assertEqual(self.obj.get(timeout=1), 'soon')
+        self.assertEqual(self.obj.get(timeout=0.1), unicode())
+        self.assertEqual(self.obj.scheduled(), 1)
+
+    def test_promote(self):
+        self.assertEqual(self.obj.promote(), 0)
+
+        t = time.time()
+        for i in xrange(5):
+            self.obj.conn.zadd(self.obj.delayed_key, t - 5 + i, i)
+        self.obj.put(5, delay=60)
+
+        self.assertEqual(self.obj.promote(), 5)
+        self.assertEqual(self.obj.qsize(), 5)
+        self.assertEqual(self.obj.scheduled(), 1)
+        self.assertEqual(self.obj.get_many(5), [unicode(i) for i in xrange(5)])
+
+    def tearDown(self):
+        self.obj.clear()
+
+
+class StreamQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.key = random_key()
+        self.obj = StreamQueue(self.key)
+
+    def test_initialize(self):
+        self.assertEqual(self.obj.group, 'techies')
+        self.assertEqual(self.obj.maxlen, None)
+        self.assertTrue(self.obj.consumer.endswith(unicode(os.getpid())))
+
+        # group already exists
+        self.obj.initialize(consumer='c1')
+        self.assertEqual(self.obj.consumer, 'c1')
+
+    def test_clear(self):
+        self.obj.put(1)
+        self.obj.clear()
+        self.assertEqual(self.obj.qsize(), 0)
+        self.assertEqual(self.obj.get(block=False), unicode())
+
+    def test_qsize(self):
+        self.assertEqual(self.obj.qsize(), 0)
+
+        s = random.randint(1, 32)
+        self.obj.put_many(xrange(s))
+        self.assertEqual(len(self.obj), s)
+
+    def test_put(self):
+        self.obj.initialize(maxlen=10)
+
+        for i in xrange(500):
+            self.obj.put(i)
+
+        self.assertTrue(self.obj.qsize() < 500)
+
+    def test_get(self):
+        self.assertEqual(self.obj.get(block=False), unicode())
+        self.assertEqual(self.obj.get(timeout=0.1), unicode())
+
+        self.obj.put_many(['a', 'b'])
+        self.assertEqual(self.obj.get(), 'a')
+        self.assertEqual(self.obj.get(timeout=0.1), 'b')
+        self.assertEqual(self.obj.get(block=False), unicode())
+
+        # delivered once per group, a new group replays the stream
+        other = StreamQueue(self.key, group='other')
+        self.assertEqual(other.get_many(5), ['a', 'b'])
+        self.assertEqual(other.get_many(5), [])
+
+    def test_get_many(self):
+        self.obj.put_many(xrange(8))
+
+        self.assertEqual(self.obj.get_many(5), [unicode(i) for i in xrange(5)])
+        self.assertEqual(list(self.obj.drain(batch=2)), ['5', '6', '7'])
+
+    def test_task_done(self):
+        self.assertRaises(ValueError, self.obj.task_done)
+
+        self.obj.put_many(xrange(3))
+        self.obj.get_many(3)
+        self.obj.task_done()
+        self.obj.task_done()
+
+        pending = self.obj.conn.execute_command(
+            'XPENDING', self.key, self.obj.group
+        )
+        self.assertEqual(pending[0], 1)
+
+    def test_reclaim(self):
+        self.obj.put_many(xrange(3))
+        dead = StreamQueue(self.key, consumer='dead')
+        self.assertEqual(dead.get_many(2), ['0', '1'])
+
+        self.assertEqual(self.obj.reclaim(60), [])
+        time.sleep(0.05)
+        self.assertEqual(self.obj.reclaim(0.01), ['0', '1'])
+
+        self.obj.task_done()
+        self.obj.task_done()
+        self.assertRaises(ValueError, self.obj.task_done)
+
+    def test_consume(self):
+        self.obj.put_many(xrange(20))
+
+        stats = self.obj.consume(unicode, workers=2, prefetch=4)
+        self.assertEqual(sum(r['items'] for r in stats), 20)
+
+        pending = self.obj.conn.execute_command(
+            'XPENDING', self.key, self.obj.group
+        )
+        self.assertEqual(pending[0], 0)
+
+    def tearDown(self):
+        self.obj.conn.delete(self.key)
+
+
+class HashRingTest(unittest.TestCase):
+
+    def test_getitem(self):
+        ring = HashRing(['a', 'b', 'c'])
+        names = [random_key() for _ in xrange(3000)]
+        nodes = [ring[name] for name in names]
+
+        self.assertEqual(set(nodes), set([0, 1, 2]))
+        self.assertEqual(nodes, [ring[name] for name in names])
+
+        for i in xrange(3):
+            self.assertTrue(nodes.count(i) > 500)
+
+        # adding a node only moves names onto the new node
+        ring = HashRing(['a', 'b', 'c', 'd'])
+        for name, node in zip(names, nodes):
+            self.assertTrue(ring[name] in (node, 3))
+
+
+class ShardedTest(unittest.TestCase):
+
+    nodes = [{'db': 0}, {'db': 1}, {'db': 2}]
+
+    def setUp(self):
+        self.key = random_key()
+
+    def test_connect(self):
+        obj = RedisBase(self.key, nodes=self.nodes)
+        self.assertTrue(obj.sharded)
+        self.assertEqual(len(obj.conns), 3)
+        self.assertTrue(obj.conn in obj.conns)
+        self.assertFalse(RedisBase(self.key).sharded)
+
+    def test_multi_counter(self):
+        obj = MultiCounter(self.key, nodes=self.nodes)
+        fields = ['f{0}'.format(i) for i in xrange(30)]
+
+        for i, field in enumerate(fields):
+            for _ in xrange(i % 3 + 1):
+                obj.incr(field)
+
+        for i, field in enumerate(fields):
+            self.assertEqual(obj.get_count(field), i % 3 + 1)
+
+        self.assertTrue(all(conn.exists(self.key) for conn in obj.conns))
+        v = obj.json()
+        self.assertEqual(len(v), 30)
+        self.assertEqual(int(v['f2']), 3)
+        v = obj.get_counts(fields[:3])
+        self.assertEqual(v, {'f0': 1, 'f1': 2, 'f2': 3})
+        v = obj.incr_many(dict((f, 10) for f in fields))
+        self.assertEqual(v['f2'], 13)
+        self.assertEqual(obj.get_count('f2'), 13)
+
+        obj.clear()
+        self.assertEqual(obj.json(), {})
+
+    def test_ts_counter(self):
+        obj = TsCounter(self.key, chunk_size=60, nodes=self.nodes)
+        t = int(time.time())
+
+        for i in xrange(30):
+            obj.incr(t + i * 60)
+
+        self.assertEqual(obj.get_count(t + 120), 1)
+        self.assertEqual(len(obj._chunks()), 30)
+        self.assertEqual(len(obj.json()), 30)
+
+        obj.clear()
+        self.assertEqual(obj._chunks(), [])
+
+    def test_count_queue(self):
+        obj = CountQueue(self.key, nodes=self.nodes)
+
+        for i in xrange(20):
+            for _ in xrange(i + 1):
+                obj.put(i)
+
+        self.assertEqual(obj.qsize(), 20)
+        self.assertEqual(obj.get(), (unicode(19), 20))
+        v = obj.get_many(5)
+        self.assertEqual(v, [(unicode(i), i + 1) for i in xrange(18, 13, -1)])
+        self.assertEqual(len(list(obj.drain(batch=4))), 14)
+        self.assertEqual(obj.get(), ())
+
+        obj.put(1)
+        obj.clear()
+        self.assertTrue(obj.empty())
+
+
+class HashTagTest(unittest.TestCase):
+
+    def setUp(self):
+        self.key = random_key()
+
+    def test_subkey(self):
+        obj = RedisBase(self.key)
+        self.assertFalse(obj.hash_tag)
+        self.assertEqual(obj._subkey(1), '{0}:1'.format(self.key))
+
+        obj = RedisBase(self.key, hash_tag=True)
+        self.assertEqual(obj._subkey(1), '{' + self.key + '}:1')
+
+    def test_ts_counter(self):
+        obj = TsCounter(self.key, chunk_size=60, hash_tag=True)
+        t = int(time.time())
+        obj.incr(t)
+        obj.incr(t + 60)
+
+        self.assertEqual(obj.get_count(t), 1)
+        self.assertEqual(
+            sorted(obj.json()),
+            ['{' + self.key + '}:' + unicode(t - t % 60 + i) for i in (0, 60)]
+        )
+
+        obj.clear()
+        self.assertEqual(obj._chunks(), [])
+
+    def test_queues(self):
+        obj = PriorityQueue(self.key, hash_tag=True)
+        obj.put('a')
+        obj.put('b', priority=0)
+        self.assertTrue(obj.conn.exists('{' + self.key + '}:0'))
+        self.assertEqual(obj.get_many(2), ['b', 'a'])
+        obj.clear()
+
+        obj = DelayedQueue(self.key, hash_tag=True)
+        self.assertEqual(obj.delayed_key, '{' + self.key + '}:delayed')
+        obj.put('a', delay=0.01)
+        time.sleep(0.02)
+        self.assertEqual(obj.get(block=False), 'a')
+        obj.clear()
+
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.key = random_key()
+        self.obj = MultiCounter(self.key, cache=2, cache_ttl=60)
+        self.other = MultiCounter(self.key)
+
+    def wait_invalidation(self, f, expected):
+        for _ in xrange(100):
+            if f() == expected:
+                break
+
+            time.sleep(0.01)
+
+        self.assertEqual(f(), expected)
+
+    def test_get_count(self):
+        self.assertEqual(self.obj.get_count('f1'), 0)
+
+        # served from cache, without a round trip
+        self.assertEqual(self.obj._cache.get(self.key, 'f1'), None)
+
+        # own writes are read back right away
+        self.obj.incr('f1')
+        self.assertEqual(self.obj.get_count('f1'), 1)
+
+        # writes by others are invalidated by the server
+        self.other.incr('f1')
+        self.wait_invalidation(lambda: self.obj.get_count('f1'), 2)
+
+    def test_lru(self):
+        for f in ('f1', 'f2', 'f3'):
+            self.obj.get_count(f)
+
+        self.assertRaises(KeyError, self.obj._cache.get, self.key, 'f1')
+        self.assertEqual(self.obj._cache.get(self.key, 'f3'), None)
+
+    def test_ttl(self):
+        obj = MultiCounter(self.key, cache=10, cache_ttl=0.05)
+        obj.get_count('f1')
+        self.assertEqual(obj._cache.get(self.key, 'f1'), None)
+
+        time.sleep(0.06)
+        self.assertRaises(KeyError, obj._cache.get, self.key, 'f1')
+        obj.close()
+
+    def test_state_counter(self):
+        obj = StateCounter(self.key + ':s', cache=10)
+        other = StateCounter(self.key + ':s')
+        self.assertTrue(obj.started)
+
+        other.stop()
+        self.wait_invalidation(lambda: obj.stopped, True)
+
+        obj.incr()
+        self.assertEqual(obj.get_count(), 1)
+        obj.clear()
+        obj.close()
+
+    def test_close(self):
+        self.obj.get_count('f1')
+        self.obj.close()
+        self.wait_invalidation(lambda: self.obj._trackers[0].alive, False)
+
+        # falls back to reading from Redis
+        self.other.incr('f1')
+        self.assertEqual(self.obj.get_count('f1'), 1)
+
+    def tearDown(self):
+        self.obj.close()
+        self.obj.clear()
+
+
+class ConcurrencyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.key = random_key()
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires fork()')
+    def test_fork(self):
+        q = Queue(self.key)
+        q.put('parent')  # connection established before fork
+        conn = q.conn
+
+        pid = os.fork()
+
+        if pid == 0:  # child
+            try:
+                ok = q.conn is not conn and q.get() == 'parent'
+                q.put('child')
+            finally:
+                os._exit(0 if ok else 1)
+
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(status, 0)
+        self.assertTrue(q.conn is conn)
+        self.assertEqual(q.get(), 'child')
+        self.assertTrue(q.empty())
+
+    def test_pickle(self):
+        obj = MultiCounter(self.key, cache=10)
+        obj.incr('f1')
+
+        copy = pickle.loads(pickle.dumps(obj))
+        self.assertEqual(copy.get_count('f1'), 1)
+        self.assertFalse(copy.conn is obj.conn)
+
+        obj.close()
+        copy.close()
+        obj.clear()
+
+    def test_threads(self):
+        obj = MultiCounter(self.key)
+        q = StreamQueue(self.key + ':q')
+        q.put_many(xrange(8))
+
+        def work():
+            for _ in xrange(100):
+                obj.incr('f1')
+
+            for _ in q.get_many(2):
+                q.task_done()
+
+        threads = [threading.Thread(target=work) for _ in xrange(4)]
+
+        for t in threads:
+            t.start()
+
+        for t in threads:
+            t.join()
+
+        self.assertEqual(obj.get_count('f1'), 400)
+        self.assertRaises(ValueError, q.task_done)
+
+        obj.clear()
+        q.conn.delete(q.key)
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.keys = [random_key(), random_key()]
+        self.objs = []
+
+    def snapshot(self, src, dst, records):
+        self.objs.extend([src, dst])
+        stream = io.StringIO()
+        self.assertEqual(src.export(stream, batch=3), records)
+
+        stream.seek(0)
+        self.assertEqual(dst.import_(stream, batch=3), records)
+
+    def test_multi_counter(self):
+        src = MultiCounter(self.keys[0])
+        src.incr_many(dict(('f{0}'.format(i), i + 1) for i in xrange(10)))
+        src.conn.expire(src.key, 3600)
+
+        dst = MultiCounter(self.keys[1], nodes=ShardedTest.nodes)
+        self.snapshot(src, dst, 1)
+        self.assertEqual(dst.get_counts(['f0', 'f9']), {'f0': 1, 'f9': 10})
+        self.assertEqual(len(dst.json()), 10)
+        self.assertTrue(dst.conns[0].ttl(dst.key) > 3500)
+
+    def test_ts_counter(self):
+        src = TsCounter(self.keys[0], chunk_size=60)
+        t = int(time.time())
+
+        for i in xrange(5):
+            src.incr(t + i * 60)
+
+        dst = TsCounter(self.keys[1], chunk_size=60, hash_tag=True)
+        self.snapshot(src, dst, 5)
+        self.assertEqual(dst.get_count(t + 240), 1)
+        self.assertEqual(len(dst._chunks()), 5)
+
+        chunk = dst._subkey(t - t % 60)
+        self.assertTrue(abs(dst.conn.ttl(chunk) - src.conn.ttl(
+            src._subkey(t - t % 60)
+        )) <= 1)
+
+    def test_queues(self):
+        src = Queue(self.keys[0])
+        src.put_many(['a', 'b'])
+        dst = Queue(self.keys[1])
+        self.snapshot(src, dst, 1)
+        self.assertEqual(list(dst), ['a', 'b'])
+
+        src = CountQueue(self.keys[0] + ':c')
+        src.put_many({'a': 2, 'b': 1})
+        dst = CountQueue(self.keys[1] + ':c', nodes=ShardedTest.nodes)
+        self.snapshot(src, dst, 1)
+        self.assertEqual(list(dst), [('a', 2), ('b', 1)])
+
+        src = PriorityQueue(self.keys[0] + ':p')
+        src.put('a')
+        src.put('b', priority=0)
+        dst = PriorityQueue(self.keys[1] + ':p')
+        self.snapshot(src, dst, 2)
+        self.assertEqual(dst.get_many(2), ['b', 'a'])
+
+        src = DelayedQueue(self.keys[0] + ':d')
+        src.put('a')
+        src.put('b', delay=60)
+        dst = DelayedQueue(self.keys[1] + ':d')
+        self.snapshot(src, dst, 2)
+        self.assertEqual(dst.scheduled(), 1)
+
+        src = StreamQueue(self.keys[0] + ':s')
+        src.put_many(['a', 'b'])
+        src.get()
+        dst = StreamQueue(self.keys[1] + ':s')
+        self.snapshot(src, dst, 1)
+        self.assertEqual(dst.get_many(5), ['b'])
+
+    def tearDown(self):
+        for obj in self.objs:
+            obj.clear()
+
+class InspectTest(unittest.TestCase):
+
+    def setUp(self):
+        self.key = random_key()
+        self.objs = []
+
+    def test_ts_counter(self):
+        c = TsCounter(self.key, chunk_size=60, ttl=600)
+        self.objs.append(c)
+        t = int(time.time())
+
+        for i in xrange(5):
+            c.incr(t + i * 60)
+        c.incr(t)
+
+        r = c.inspect(batch=2)
+        self.assertEqual(r['landmine'], 'TsCounter')
+        self.assertEqual(r['keys'], 5)
+        self.assertEqual(r['elements'], 5)
+        self.assertEqual(r['types'], {'hash': 5})
+        self.assertEqual(sum(r['encodings'].values()), 5)
+        self.assertEqual(r['ttl']['<1h'], 5)
+        self.assertEqual(r['ttl']['none'], 0)
+        self.assertTrue(r['memory'] > 0)
+
+    def test_queues(self):
+        q = CountQueue(self.key, nodes=ShardedTest.nodes)
+        self.objs.append(q)
+        q.put_many(dict(('i{0}'.format(i), i + 1) for i in xrange(10)))
+
+        r = q.inspect()
+        self.assertEqual(r['elements'], 10)
+        self.assertEqual(r['ttl'], {
+            '<1m': 0, '<1h': 0, '<1d': 0, '>=1d': 0, 'none': r['keys']
+        })
+
+        # empty levels hold no key
+        q = PriorityQueue(self.key + ':p', levels=5)
+        self.objs.append(q)
+        q.put('a', priority=1)
+        q.put('b', priority=3)
+        r = q.inspect()
+        self.assertEqual((r['keys'], r['elements']), (2, 2))
+        self.assertEqual(r['types'], {'zset': 2})
+
+        q.clear()
+        self.assertEqual(q.inspect()['keys'], 0)
+
+    def tearDown(self):
+        for obj in self.objs:
+            obj.clear()
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.key = random_key()
+        self.mc = MultiCounter(self.key + ':m')
+        self.ts = TsCounter(self.key + ':t')
+        self.sc = StateCounter(self.key + ':s')
+        self.q = Queue(self.key + ':q')
+        self.objs = [self.mc, self.ts, self.sc, self.q]
+
+    def test_batch(self):
+        t = int(time.time())
+
+        with batch() as b:
+            counts = self.mc.incr_many(['a', 'b', 'a'])
+            count = self.mc.incr('a', 2)
+            self.ts.incr(t)
+            self.sc.incr()
+            put = self.q.put('x')
+            self.q.put_many(['y', 'z'])
+
+            # queued, one pipeline for all landmines on the same db
+            self.assertEqual(len(b._pipes), 1)
+            self.assertFalse(count.done())
+            self.assertRaises(RuntimeError, count.result)
+            self.assertEqual(self.q.qsize(), 0)
+
+        self.assertEqual(counts.result(), {'a': 2, 'b': 1})
+        self.assertEqual(count.result(), 4)
+        self.assertEqual(put.result(), None)
+        self.assertEqual(self.ts.get_count(t), 1)
+        self.assertEqual(self.sc.get_count(), 1)
+        self.assertEqual(list(self.q), ['x', 'y', 'z'])
+
+        # outside a batch, calls run immediately
+        self.assertEqual(self.mc.incr('a'), 5)
+
+    def test_transaction(self):
+        with batch(transaction=True):
+            a = self.mc.incr('a')
+            counts = self.mc.get_counts(['a', 'b'])
+
+        self.assertEqual(a.result(), 1)
+        self.assertEqual(counts.result(), {'a': 1, 'b': 0})
+
+    def test_nested(self):
+        with batch() as outer:
+            with batch() as inner:
+                self.assertTrue(inner is outer)
+                a = self.mc.incr('a')
+
+            self.assertFalse(a.done())
+
+        self.assertEqual(a.result(), 1)
+
+    def test_errors(self):
+        self.q.put('x')
+        wrong = MultiCounter(self.q.key)
+
+        with batch():
+            a = self.mc.incr('a')
+            b = wrong.incr('a')
+
+        self.assertEqual(a.result(), 1)
+        self.assertTrue(b.exception() is not None)
+        self.assertRaises(Exception, b.result)
+
+        # nothing is sent when the block raises
+        try:
+            with batch():
+                a = self.mc.incr('a')
+                raise KeyError('a')
+        except KeyError:
+            pass
+
+        self.assertTrue(isinstance(a.exception(), KeyError))
+        self.assertEqual(self.mc.get_count('a'), 1)
+
+    def test_sharded(self):
+        mc = MultiCounter(self.key + ':sharded', nodes=ShardedTest.nodes)
+        limiter = RateLimiter(self.key + ':r', limit=1)
+        self.objs.extend([mc, limiter])
+        fields = ['f{0}'.format(i) for i in xrange(20)]
+
+        with batch() as b:
+            counts = mc.incr_many(fields)
+            allowed = [limiter.allow('u') for _ in xrange(2)]
+            self.assertEqual(len(b._pipes), 3)
+
+        self.assertEqual(counts.result(), dict((f, 1) for f in fields))
+        self.assertEqual([f.result() for f in allowed], [True, False])
+        self.assertEqual(mc.get_counts(fields), counts.result())
+
+    def tearDown(self):
+        for obj in self.objs:
+            obj.clear()
+
 if __name__ == '__main__':
     unittest.main()
@@ -3,6 +3,7 @@
 
 import unittest
 import random
+import time
 
 import sys
 import os
@@ -14,7 +15,7 @@ sys.path.append(target_path)
 
 # Compat layer to support some tests
 from compat import (
-    unicode, xrange
+    unicode, xrange, Queue as StdQueue
 )
 
 # Queue to support testing
@@ -37,12 +38,14 @@ class QueueHandlerTest(unittest.TestCase):
         self.cq = CountQueue(key=self.key, host='localhost', port=6379, db=2)
 
         self.logger = logging.getLogger(__name__)
+        self.handlers = []
 
         for q in [self.q, self.uq, self.cq]:
             handler = QueueHandler(q)
             _format = '%(levelname)s:%(message)s'
             handler.setFormatter(logging.Formatter(_format))
             self.logger.addHandler(handler)
+            self.handlers.append(handler)
 
     def test_emit(self):
         times = random.randint(3, 10)
@@ -82,7 +85,72 @@ class QueueHandlerTest(unittest.TestCase):
         actual = self.cq.get()
         self.assertEqual(actual, ())
 
+    def test_coalesce(self):
+        logger = logging.getLogger(__name__ + '.coalesce')
+        logger.propagate = False
+        handlers = []
+
+        for q in [self.q, self.uq, self.cq]:
+            handler = QueueHandler(q, coalesce=0.1)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            handlers.append(handler)
+
+        times = random.randint(3, 10)
+
+        for i in xrange(times):
+            logger.error('storm')
+
+        logger.error('calm')
+
+        # nothing sent until the window ends
+        self.assertEqual(len(self.q), 0)
+        self.assertEqual(len(self.cq), 0)
+
+        for _ in xrange(100):
+            if len(self.cq):
+                break
+
+            time.sleep(0.01)
+
+        self.assertEqual(len(self.q), times + 1)
+        self.assertEqual(len(self.uq), 2)
+        self.assertEqual(self.cq.get(), ('storm', times))
+        self.assertEqual(self.cq.get(), ('calm', 1))
+
+        # flushed right away on close
+        logger.error('storm')
+        handlers[2].close()
+        self.assertEqual(self.cq.get(), ('storm', 1))
+
+        for handler in handlers:
+            logger.removeHandler(handler)
+            handler.close()
+
+    def test_coalesce_std_queue(self):
+        q = StdQueue()
+        handler = QueueHandler(q, coalesce=60)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+
+        logger = logging.getLogger(__name__ + '.std')
+        logger.propagate = False
+        logger.addHandler(handler)
+
+        for i in xrange(3):
+            logger.error('storm')
+
+        self.assertTrue(q.empty())
+        handler.flush()
+        self.assertEqual([q.get() for _ in xrange(3)], ['storm'] * 3)
+        self.assertTrue(q.empty())
+
+        logger.removeHandler(handler)
+        handler.close()
+
     def tearDown(self):
+        for handler in self.handlers:
+            self.logger.removeHandler(handler)
+
         self.q.conn.delete(self.key)
         self.uq.conn.delete(self.key)
         self.cq.conn.delete(self.key)